@@ -1,24 +1,59 @@
 """
 Agent Extractor: Uses LLMFallbackClient to extract requirements from COBOL or other code and stores results in Qdrant vector DB.
 """
+import asyncio
+import functools
 import os
+import uuid
+from typing import List
 from llm_fallback_client import LLMFallbackClient
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from prompt_cache import semantic_aask, semantic_ask
+from embeddings import encode_smart, get_model, get_qdrant_client
 
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 COLLECTION = "agent_requirements"
+# Concurrent LLM calls per process, shared by every async extraction; ~8 in flight keeps
+# a few-second round-trip under a 500 requests/minute provider quota
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
-qdrant = QdrantClient(QDRANT_URL)
+USER_PROMPT = (
+    "As a business analyst, I want to extract the business rules and business requirements from the program and the code provided. "
+    "The results should be well-formatted text suitable for creating documents, such as markdown documents. I wanted only business rules and requirements and relevant information. "
+    "Do not include any other statements. which are not relevant to the requirements and business rules or context."
+)
+
+model = get_model()
+qdrant = get_qdrant_client(QDRANT_URL)
+_collection_ready = False
+
+
+@functools.lru_cache(maxsize=1)
+def get_llm_client() -> LLMFallbackClient:
+    """
+    Shared LLMFallbackClient, so provider clients and their connection pools are reused across requests.
+    """
+    return LLMFallbackClient()
+
+
+@functools.lru_cache(maxsize=1)
+def _llm_slots() -> asyncio.Semaphore:
+    """
+    Process-wide cap of LLM_MAX_CONCURRENCY async LLM calls. Created on first use, inside the server's event loop.
+    """
+    return asyncio.Semaphore(LLM_MAX_CONCURRENCY)
 
 
 def ensure_collection_exists():
     """
-    Ensure the agent_requirements collection exists in Qdrant.
+    Ensure the agent_requirements collection exists in Qdrant. Checked once per process.
     """
-    from qdrant_client.http.models import Distance, VectorParams
+    from qdrant_client.http.models import (
+        Distance, ScalarQuantization, ScalarQuantizationConfig, ScalarType, VectorParams
+    )
     
+    global _collection_ready
+    if _collection_ready:
+        return
     try:
         # Check if collection exists
         collections = qdrant.get_collections()
@@ -28,38 +63,59 @@ def ensure_collection_exists():
             # Create collection with proper vector configuration
             qdrant.create_collection(
                 collection_name=COLLECTION,
-                vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+                vectors_config=VectorParams(size=384, distance=Distance.COSINE, on_disk=True),
+                quantization_config=ScalarQuantization(
+                    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, always_ram=True)
+                )
             )
             print(f"Created collection: {COLLECTION}")
         else:
             print(f"Collection {COLLECTION} already exists")
+        _collection_ready = True
     except Exception as e:
         print(f"Error ensuring collection exists: {e}")
         raise
 
 
+def _response_text(response: dict):
+    """
+    Turn an LLMFallbackClient response into the text returned to callers.
+    """
+    if response.get("success"):
+        # Return only formatted_text as plain string if present
+        formatted = response.get("formatted_text")
+        if formatted:
+            return formatted
+        # Fallback to raw result
+        result_text = response.get("result", "")
+        return result_text
+    else:
+        return response.get("error", "LLM extraction failed.")
+
+
 def extract_requirements_with_llm(code: str, language: str = "COBOL"):
     """
     Extract requirements using LLMFallbackClient (OpenAI, Gemini, etc).
     """
     try:
-        client = LLMFallbackClient()
-        user_prompt = (
-            "As a business analyst, I want to extract the business rules and business requirements from the program and the code provided. "
-            "The results should be well-formatted text suitable for creating documents, such as markdown documents. I wanted only business rules and requirements and relevant information. "
-            "Do not include any other statements. which are not relevant to the requirements and business rules or context."
-        )
-        response = client.ask(user_prompt, code, language)
-        if response.get("success"):
-            # Return only formatted_text as plain string if present
-            formatted = response.get("formatted_text")
-            if formatted:
-                return formatted
-            # Fallback to raw result
-            result_text = response.get("result", "")
-            return result_text
-        else:
-            return response.get("error", "LLM extraction failed.")
+        client = get_llm_client()
+        # Semantic cache (if enabled), then the client's exact-match cache, then the LLM
+        response = semantic_ask(client, USER_PROMPT, code, language)
+        return _response_text(response)
+    except Exception as e:
+        return [{"error": f"LLMFallbackClient error: {str(e)}"}]
+
+
+async def extract_requirements_with_llm_async(code: str, language: str = "COBOL"):
+    """
+    Async version of extract_requirements_with_llm using LLMFallbackClient.aask.
+    Waits for a free slot when LLM_MAX_CONCURRENCY calls are already in flight.
+    """
+    try:
+        client = get_llm_client()
+        async with _llm_slots():
+            response = await semantic_aask(client, USER_PROMPT, code, language)
+        return _response_text(response)
     except Exception as e:
         return [{"error": f"LLMFallbackClient error: {str(e)}"}]
 
@@ -68,7 +124,7 @@ def store_requirements_in_vector_db(requirements, code):
     """
     Store requirements in Qdrant vector DB.
     """
-    from qdrant_client.http.models import PointStruct
+    from qdrant_client.http.models import Batch
     
     # Ensure collection exists before storing
     ensure_collection_exists()
@@ -77,39 +133,54 @@ def store_requirements_in_vector_db(requirements, code):
         texts = [requirements]
     else:
         texts = [r.get("text", str(r)) for r in requirements]
-    embeddings = model.encode(texts)
-    points = [
-        PointStruct(
-            id=i,
-            vector=embeddings[i].tolist(),
-            payload={
-                "requirement": texts[i],
-                "source_code": code
-            }
-        )
-        for i in range(len(texts))
-    ]
-    qdrant.upsert(collection_name=COLLECTION, points=points)
-    return points
+    embeddings = encode_smart(texts)
+    batch = Batch(
+        ids=[str(uuid.uuid4()) for _ in texts],
+        vectors=embeddings.tolist(),
+        payloads=[{"requirement": text, "source_code": code} for text in texts]
+    )
+    qdrant.upsert(collection_name=COLLECTION, points=batch)
+    return batch
 
 
-def agent_extract(code: str, language: str = "COBOL"):
+def _store_extracted(requirements, code: str):
     """
-    Main entry: extract requirements using LLM and store in vector DB.
+    Normalize LLM output to plain text and store it alongside the source code.
     """
-    # Ensure collection exists before processing
-    ensure_collection_exists()
-    
-    requirements = extract_requirements_with_llm(code, language)
     # Ensure requirements is plain text for embedding
-    from llm_fallback_client import LLMFallbackClient
     if isinstance(requirements, dict):
-        requirements_text = LLMFallbackClient().extract_text(requirements)
+        requirements_text = get_llm_client().extract_text(requirements)
     else:
         requirements_text = str(requirements)
     store_requirements_in_vector_db(requirements_text, code)
+
+
+def agent_extract(code: str, language: str = "COBOL"):
+    """
+    Main entry: extract requirements using LLM and store in vector DB.
+    """
+    requirements = extract_requirements_with_llm(code, language)
+    _store_extracted(requirements, code)
+    return requirements
+
+
+async def agent_extract_async(code: str, language: str = "COBOL"):
+    """
+    Async version of agent_extract. Qdrant and embedding work runs in the default executor.
+    """
+    loop = asyncio.get_running_loop()
+    requirements = await extract_requirements_with_llm_async(code, language)
+    await loop.run_in_executor(None, _store_extracted, requirements, code)
     return requirements
 
+
+async def agent_extract_many(codes: List[str], language: str = "COBOL"):
+    """
+    Extract requirements for many programs concurrently, within the process-wide LLM_MAX_CONCURRENCY cap.
+    Results are returned in the same order as `codes`.
+    """
+    return await asyncio.gather(*(agent_extract_async(code, language) for code in codes))
+
 # For API usage
 if __name__ == "__main__":
     sample_code = "IDENTIFICATION DIVISION. PROGRAM-ID. DEMO. * Business rule: Validate input."
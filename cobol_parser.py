@@ -0,0 +1,205 @@
+"""
+COBOL parser: structural information (divisions, data items, paragraphs, business logic, file I/O, comments)
+extracted from COBOL source. Imports no model or Qdrant client, so parse worker processes start cheaply.
+"""
+import mmap
+import re
+import os
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+
+
+class COBOLParser:
+    """
+    Parse COBOL programs into the program_info dicts stored by COBOLRequirementsExtractor.
+    """
+    
+    # COBOL patterns, compiled once and shared by every parse. Content-level patterns
+    # run on the raw bytes of the file (case-insensitive); captured text is decoded
+    # and uppercased by _text().
+    _RE_PROGRAM_ID = re.compile(rb'PROGRAM-ID\.\s*([A-Z0-9\-]+)', re.IGNORECASE)
+    
+    # Each division section, up to the next division header (\r? keeps CRLF out of the text)
+    _RE_DIVISIONS = {
+        'IDENTIFICATION': re.compile(rb'(IDENTIFICATION\s+DIVISION\..*?)(?=\r?\n\s*[A-Z]+\s+DIVISION\.|\r?$)', re.DOTALL | re.IGNORECASE),
+        'ENVIRONMENT': re.compile(rb'(ENVIRONMENT\s+DIVISION\..*?)(?=\r?\n\s*[A-Z]+\s+DIVISION\.|\r?$)', re.DOTALL | re.IGNORECASE),
+        'DATA': re.compile(rb'(DATA\s+DIVISION\..*?)(?=\r?\n\s*[A-Z]+\s+DIVISION\.|\r?$)', re.DOTALL | re.IGNORECASE),
+        'PROCEDURE': re.compile(rb'(PROCEDURE\s+DIVISION\..*?)(?=\r?$)', re.DOTALL | re.IGNORECASE)
+    }
+    
+    # Line patterns for _scan_lines: data items (level number, name, PIC clause, etc.)
+    # and paragraph names, which only count after the PROCEDURE DIVISION header
+    _RE_DATA_ITEM = re.compile(r'\s*(\d{2})\s+([A-Z0-9\-]+).*?PIC\s+([A-Z0-9\(\)]+)')
+    _RE_PROCEDURE_DIVISION = re.compile(r'PROCEDURE\s+DIVISION\.')
+    _RE_PARAGRAPH = re.compile(r'\s*([A-Z0-9\-]+)\.\s*')
+    
+    # Common business logic patterns in COBOL. Kept as separate patterns rather than one
+    # alternation: matches may overlap (a MOVE inside an IF) and results are grouped by kind.
+    _RE_BUSINESS_LOGIC = tuple(re.compile(pattern, re.DOTALL | re.IGNORECASE) for pattern in (
+        rb'IF\s+.*?THEN.*?(?:END-IF|\.)',
+        rb'PERFORM\s+.*?UNTIL.*?',
+        rb'COMPUTE\s+.*?=.*?\.',
+        rb'MOVE\s+.*?TO.*?\.',
+        rb'ADD\s+.*?TO.*?\.',
+        rb'SUBTRACT\s+.*?FROM.*?\.'
+    ))
+    
+    _RE_FILE_OPERATIONS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+        rb'OPEN\s+(INPUT|OUTPUT|I-O|EXTEND)\s+([A-Z0-9\-]+)',
+        rb'READ\s+([A-Z0-9\-]+)',
+        rb'WRITE\s+([A-Z0-9\-]+)',
+        rb'CLOSE\s+([A-Z0-9\-]+)'
+    ))
+    
+    @classmethod
+    def parse_cobol_file(cls, file_path: str) -> Dict:
+        """
+        Parse COBOL file and extract structural information.
+        Use this as a base for GitHub Copilot to suggest improvements.
+        """
+        with open(file_path, 'rb') as f:
+            # mmap cannot map an empty file
+            if os.fstat(f.fileno()).st_size == 0:
+                return cls._parse_content(b'', file_path)
+            # Map the file instead of reading it: the page cache is scanned in place
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                return cls._parse_content(content, file_path)
+    
+    @classmethod
+    def _parse_content(cls, content, file_path: str) -> Dict:
+        """Extract program information from raw COBOL bytes (bytes or mmap)"""
+        data_items, procedures, comments = cls._scan_lines(cls._iter_lines(content))
+        
+        # Basic COBOL structure extraction
+        program_info = {
+            'file_path': file_path,
+            'file_name': os.path.basename(file_path),
+            'program_id': cls._extract_program_id(content),
+            'divisions': cls._extract_divisions(content),
+            'data_items': data_items,
+            'procedures': procedures,
+            'business_logic': cls._extract_business_logic(content),
+            'file_operations': cls._extract_file_operations(content),
+            'comments': comments
+        }
+        
+        return program_info
+    
+    @staticmethod
+    def _text(fragment: bytes) -> str:
+        """Decode a matched fragment the way the file used to be read: UTF-8, universal newlines, uppercase"""
+        return fragment.decode('utf-8', 'ignore').replace('\r\n', '\n').upper()
+    
+    @staticmethod
+    def _iter_lines(content) -> Iterator[str]:
+        """Yield each line of the raw content decoded and uppercased, one at a time"""
+        start = 0
+        while start < len(content):
+            end = content.find(b'\n', start)
+            end = len(content) if end == -1 else end + 1
+            yield content[start:end].decode('utf-8', 'ignore').upper()
+            start = end
+    
+    @classmethod
+    def _extract_program_id(cls, content: bytes) -> str:
+        """Extract PROGRAM-ID from COBOL content"""
+        match = cls._RE_PROGRAM_ID.search(content)
+        return cls._text(match.group(1)) if match else "UNKNOWN"
+    
+    @classmethod
+    def _extract_divisions(cls, content: bytes) -> Dict[str, str]:
+        """Extract the four COBOL divisions"""
+        divisions = {}
+        
+        # Extract each division section
+        for div_name, pattern in cls._RE_DIVISIONS.items():
+            match = pattern.search(content)
+            divisions[div_name] = cls._text(match.group(1)) if match else ""
+        
+        return divisions
+    
+    @classmethod
+    def _extract_business_logic(cls, content: bytes) -> List[str]:
+        """Extract business rules and logic patterns"""
+        business_rules = []
+        
+        for pattern in cls._RE_BUSINESS_LOGIC:
+            business_rules.extend(cls._text(match) for match in pattern.findall(content))
+        
+        return business_rules
+    
+    @classmethod
+    def _extract_file_operations(cls, content: bytes) -> List[str]:
+        """Extract file I/O operations"""
+        file_ops = []
+        
+        for pattern in cls._RE_FILE_OPERATIONS:
+            matches = [
+                tuple(cls._text(group) for group in match) if isinstance(match, tuple) else cls._text(match)
+                for match in pattern.findall(content)
+            ]
+            file_ops.extend([f"{op[0]} {op[1]}" if len(op) > 1 else str(op) for op in matches])
+        
+        return file_ops
+    
+    @classmethod
+    def _scan_lines(cls, lines: Iterable[str]) -> Tuple[List[Dict], List[str], List[str]]:
+        """
+        Collect data items, PROCEDURE DIVISION paragraph names and comments in a single
+        pass over the lines of the program (trailing line endings are ignored).
+        """
+        data_items = []
+        procedures = []
+        comments = []
+        in_procedure_division = False
+        
+        for line in lines:
+            line = line.rstrip('\r\n')
+            
+            # COBOL comments start with * in column 7 or are between *> markers
+            if len(line) > 6 and line[6] == '*':
+                comment = line[7:].strip()
+                if len(comment) > 10:  # Only meaningful comments
+                    comments.append(comment)
+            elif '*>' in line:
+                comment = line.split('*>')[1].strip()
+                if len(comment) > 10:
+                    comments.append(comment)
+            
+            item = cls._RE_DATA_ITEM.match(line)
+            if item:
+                data_items.append({
+                    'level': item.group(1),
+                    'name': item.group(2),
+                    'picture': item.group(3)
+                })
+            
+            # Paragraph names only count inside the PROCEDURE DIVISION,
+            # including any text after the division header on the same line
+            start = 0
+            if not in_procedure_division:
+                header = cls._RE_PROCEDURE_DIVISION.search(line)
+                if not header:
+                    continue
+                in_procedure_division = True
+                start = header.end()
+            paragraph = cls._RE_PARAGRAPH.fullmatch(line, start)
+            if paragraph:
+                procedures.append(paragraph.group(1))
+        
+        return data_items, procedures, comments
+
+
+def parse_file(file_path: str) -> Dict:
+    """
+    Parse a COBOL file without an extractor instance (no model or Qdrant connection).
+    Module-level so it can be sent to worker processes.
+    """
+    return COBOLParser.parse_cobol_file(file_path)
+
+
+def _parse_file_safe(file_path: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """parse_file() returning (program_info, None) or (None, error) instead of raising in a worker"""
+    try:
+        return parse_file(file_path), None
+    except Exception as e:
+        return None, str(e)
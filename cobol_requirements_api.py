@@ -2,14 +2,21 @@
 from fastapi import FastAPI, Request, UploadFile, File, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, JSONResponse
-from agent_extractor import agent_extract
+from fastapi.responses import RedirectResponse, ORJSONResponse
+from agent_extractor import agent_extract_async, agent_extract_many, ensure_collection_exists
 from cobol_requirements_extractor import COBOLRequirementsExtractor
 import tempfile
 import os
+import aiofiles
+import orjson
 from typing import List, Dict
 
-app = FastAPI(title="COBOL Requirements Extraction API", version="1.0")
+class APIResponse(ORJSONResponse):
+    """orjson rendering; values orjson cannot encode natively (e.g. SDK objects in LLM results) become str"""
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+app = FastAPI(title="COBOL Requirements Extraction API", version="1.0", default_response_class=APIResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,30 +25,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def _bootstrap():
+    """Create the agent collection once, before the first request is served"""
+    ensure_collection_exists()
+
 # Register /agent-extract endpoint
 @app.post("/agent-extract")
 async def agent_extract_api(request: Request):
     data = await request.json()
     code = data.get("code", "")
     language = data.get("language", "COBOL")
-    results = agent_extract(code, language)
-    # Ensure all results are serializable
-    def make_serializable(item):
-        if isinstance(item, dict):
-            # Recursively convert any non-serializable values
-            return {k: str(v) if not isinstance(v, (str, int, float, bool, type(None), dict, list)) else v for k, v in item.items()}
-        elif isinstance(item, (str, int, float, bool, type(None))):
-            return item
-        else:
-            return str(item)
-    if isinstance(results, list):
-        results = [make_serializable(r) for r in results]
-    else:
-        results = make_serializable(results)
-    return {"requirements": results}
+    results = await agent_extract_async(code, language)
+    # Returned as a response object so FastAPI does not run jsonable_encoder over the LLM output first
+    return APIResponse({"requirements": results})
+
+@app.post("/agent-extract-batch", summary="Extract requirements from many programs concurrently")
+async def agent_extract_batch_api(data: dict = Body(...)):
+    """
+    Run agent extraction for several programs at once; LLM calls are issued concurrently.
+    Example body: {"codes": ["IDENTIFICATION DIVISION. ...", "..."], "language": "COBOL"}
+    """
+    codes = data.get("codes", [])
+    language = data.get("language", "COBOL")
+    
+    if not isinstance(codes, list) or not codes or not all(isinstance(c, str) and c for c in codes):
+        raise HTTPException(status_code=400, detail="codes must be a non-empty list of non-empty strings")
+    
+    results = await agent_extract_many(codes, language)
+    return APIResponse({
+        "requirements": results,
+        "count": len(results)
+    })
 
 # Initialize the COBOL extractor
 extractor = COBOLRequirementsExtractor()
+UPLOAD_CHUNK_SIZE = 1 << 20
 
 # Serve static test UI
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -69,11 +88,12 @@ async def upload_cobol_file(file: UploadFile = File(...)):
     
     tmp_file_path = None
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file.filename}") as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        # Stream the upload to a temporary file in 1 MiB chunks instead of buffering it whole
+        fd, tmp_file_path = tempfile.mkstemp(suffix=f"_{file.filename}")
+        os.close(fd)
+        async with aiofiles.open(tmp_file_path, 'wb') as tmp_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await tmp_file.write(chunk)
         
         # Extract requirements
         result = extractor.extract_requirements_from_program(tmp_file_path)
@@ -120,6 +140,31 @@ def search_requirements(query: dict = Body(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
 
+@app.post("/search-requirements-batch", summary="Search for several queries at once")
+def search_requirements_batch(query: dict = Body(...)):
+    """
+    Run several similarity searches in a single vector database request.
+    Example body: {"queries": ["customer validation logic", "credit limit checks"], "limit": 5}
+    """
+    queries = query.get("queries", [])
+    limit = query.get("limit", 5)
+    
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        raise HTTPException(status_code=400, detail="queries must be a non-empty list of non-empty strings")
+    
+    try:
+        results = extractor.search_many(queries, limit)
+        return {
+            "status": "success",
+            "results": [
+                {"query": q, "results": r, "count": len(r)}
+                for q, r in zip(queries, results)
+            ],
+            "count": len(results)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
+
 @app.get("/list-all-requirements", summary="Get all extracted requirements")
 def list_all_requirements():
     """
@@ -147,18 +192,9 @@ def analyze_cobol_text(data: dict = Body(...)):
     if not cobol_code:
         raise HTTPException(status_code=400, detail="COBOL code cannot be empty")
     
-    tmp_file_path = None
     try:
-        # Save to temporary file for processing
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.cbl') as tmp_file:
-            tmp_file.write(cobol_code)
-            tmp_file_path = tmp_file.name
-        
-        # Extract requirements
-        result = extractor.extract_requirements_from_program(tmp_file_path)
-        
-        # Clean up
-        os.unlink(tmp_file_path)
+        # Parse the text in memory; no temporary file is needed
+        result = extractor.extract_requirements_from_string(cobol_code, f"{program_name}.cbl")
         
         return {
             "status": "success",
@@ -167,12 +203,6 @@ def analyze_cobol_text(data: dict = Body(...)):
         }
     
     except Exception as e:
-        if tmp_file_path and os.path.exists(tmp_file_path):
-            try:
-                os.unlink(tmp_file_path)
-            except:
-                pass
-        
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
 
 @app.get("/health", summary="Health check")
@@ -187,7 +217,7 @@ def health_check():
             "collections": [c.name for c in collections.collections] if collections else []
         }
     except Exception as e:
-        return JSONResponse(
+        return APIResponse(
             status_code=503,
             content={
                 "status": "unhealthy",
@@ -200,23 +230,27 @@ def health_check():
 def get_statistics():
     """Get statistics about extracted requirements"""
     try:
-        requirements = extractor.get_all_requirements()
-        
-        # Basic statistics
-        total_programs = len(requirements)
-        
-        # Count by file type if available
+        total_programs = 0
         file_types = {}
-        for req in requirements:
+        last_extraction = None
+        # Single streaming pass over the two payload fields the statistics need
+        for req in extractor.iter_requirements(with_payload=['file_name', 'extraction_timestamp']):
+            total_programs += 1
+            
+            # Count by file type if available
             file_name = req.get('file_name', '')
             ext = os.path.splitext(file_name)[1].lower()
             file_types[ext] = file_types.get(ext, 0) + 1
+            
+            timestamp = req.get('extraction_timestamp', '')
+            if last_extraction is None or timestamp > last_extraction:
+                last_extraction = timestamp
         
         return {
             "status": "success",
             "total_programs": total_programs,
             "file_types": file_types,
-            "last_extraction": max([req.get('extraction_timestamp', '') for req in requirements]) if requirements else None
+            "last_extraction": last_extraction
         }
     
     except Exception as e:
@@ -1,24 +1,36 @@
 # cobol_requirements_extractor.py
 
-from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
-import re
+from qdrant_client import models
+from embeddings import encode_smart, get_model, get_qdrant_client
+from cobol_parser import COBOLParser, parse_file, _parse_file_safe
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 import os
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 import uuid
 import datetime
+import numpy as np
 
-class COBOLRequirementsExtractor:
+class COBOLRequirementsExtractor(COBOLParser):
     """
     Extract business requirements from COBOL programs and store in vector database.
     Designed to work with GitHub Copilot for intelligent analysis without third-party LLMs.
+    Parsing is inherited from COBOLParser.
     """
     
+    # Points per upsert request, and the size above which uploads go through upload_collection
+    UPSERT_BATCH_SIZE = 128
+    UPLOAD_COLLECTION_THRESHOLD = 4096
+    # Qdrant's default indexing threshold, restored when bulk_mode() exits
+    INDEXING_THRESHOLD = 20000
+    # Files below which parsing stays in-process: a parse takes ~2ms, less than starting a worker pool
+    PARALLEL_PARSE_MIN_FILES = 500
+    
     def __init__(self, api_key=None):
         self.collection_name = "cobol_requirements"
         self.qdrant_url = "http://localhost:6333"
-        self.client = QdrantClient(url=self.qdrant_url, api_key=api_key)
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.client = get_qdrant_client(self.qdrant_url, api_key)
+        self.model = get_model()
         self._ensure_collection()
     
     def _ensure_collection(self):
@@ -26,143 +38,31 @@ class COBOLRequirementsExtractor:
         try:
             self.client.get_collection(self.collection_name)
         except:
+            # Original vectors live on disk; int8 copies stay in RAM for search
             self.client.recreate_collection(
                 collection_name=self.collection_name,
-                vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE)
+                vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE, on_disk=True),
+                quantization_config=models.ScalarQuantization(
+                    scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+                )
             )
     
-    def parse_cobol_file(self, file_path: str) -> Dict:
+    @contextlib.contextmanager
+    def bulk_mode(self):
         """
-        Parse COBOL file and extract structural information.
-        Use this as a base for GitHub Copilot to suggest improvements.
+        Suspend HNSW indexing while importing many points so the graph is built once at the end.
         """
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read().upper()
-        
-        # Basic COBOL structure extraction
-        program_info = {
-            'file_path': file_path,
-            'file_name': os.path.basename(file_path),
-            'program_id': self._extract_program_id(content),
-            'divisions': self._extract_divisions(content),
-            'data_items': self._extract_data_items(content),
-            'procedures': self._extract_procedures(content),
-            'business_logic': self._extract_business_logic(content),
-            'file_operations': self._extract_file_operations(content),
-            'comments': self._extract_comments(content)
-        }
-        
-        return program_info
-    
-    def _extract_program_id(self, content: str) -> str:
-        """Extract PROGRAM-ID from COBOL content"""
-        match = re.search(r'PROGRAM-ID\.\s*([A-Z0-9\-]+)', content)
-        return match.group(1) if match else "UNKNOWN"
-    
-    def _extract_divisions(self, content: str) -> Dict[str, str]:
-        """Extract the four COBOL divisions"""
-        divisions = {}
-        
-        # Extract each division section
-        div_patterns = {
-            'IDENTIFICATION': r'(IDENTIFICATION\s+DIVISION\..*?)(?=\n\s*[A-Z]+\s+DIVISION\.|$)',
-            'ENVIRONMENT': r'(ENVIRONMENT\s+DIVISION\..*?)(?=\n\s*[A-Z]+\s+DIVISION\.|$)',
-            'DATA': r'(DATA\s+DIVISION\..*?)(?=\n\s*[A-Z]+\s+DIVISION\.|$)',
-            'PROCEDURE': r'(PROCEDURE\s+DIVISION\..*?)(?=$)'
-        }
-        
-        for div_name, pattern in div_patterns.items():
-            match = re.search(pattern, content, re.DOTALL)
-            divisions[div_name] = match.group(1) if match else ""
-        
-        return divisions
-    
-    def _extract_data_items(self, content: str) -> List[Dict]:
-        """Extract data items and their levels"""
-        data_items = []
-        
-        # Pattern for data items (level number, name, PIC clause, etc.)
-        pattern = r'^\s*(\d{2})\s+([A-Z0-9\-]+).*?PIC\s+([A-Z0-9\(\)]+)'
-        
-        for match in re.finditer(pattern, content, re.MULTILINE):
-            data_items.append({
-                'level': match.group(1),
-                'name': match.group(2),
-                'picture': match.group(3)
-            })
-        
-        return data_items
-    
-    def _extract_procedures(self, content: str) -> List[str]:
-        """Extract paragraph/section names from PROCEDURE DIVISION"""
-        procedures = []
-        
-        # Pattern for paragraph names
-        pattern = r'^\s*([A-Z0-9\-]+)\.\s*$'
-        
-        # Only look in PROCEDURE DIVISION
-        proc_match = re.search(r'PROCEDURE\s+DIVISION\.(.*)', content, re.DOTALL)
-        if proc_match:
-            proc_content = proc_match.group(1)
-            for match in re.finditer(pattern, proc_content, re.MULTILINE):
-                procedures.append(match.group(1))
-        
-        return procedures
-    
-    def _extract_business_logic(self, content: str) -> List[str]:
-        """Extract business rules and logic patterns"""
-        business_rules = []
-        
-        # Common business logic patterns in COBOL
-        patterns = [
-            r'IF\s+.*?THEN.*?(?:END-IF|\.)',
-            r'PERFORM\s+.*?UNTIL.*?',
-            r'COMPUTE\s+.*?=.*?\.',
-            r'MOVE\s+.*?TO.*?\.',
-            r'ADD\s+.*?TO.*?\.',
-            r'SUBTRACT\s+.*?FROM.*?\.'
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, content, re.DOTALL)
-            business_rules.extend(matches)
-        
-        return business_rules
-    
-    def _extract_file_operations(self, content: str) -> List[str]:
-        """Extract file I/O operations"""
-        file_ops = []
-        
-        patterns = [
-            r'OPEN\s+(INPUT|OUTPUT|I-O|EXTEND)\s+([A-Z0-9\-]+)',
-            r'READ\s+([A-Z0-9\-]+)',
-            r'WRITE\s+([A-Z0-9\-]+)',
-            r'CLOSE\s+([A-Z0-9\-]+)'
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, content)
-            file_ops.extend([f"{op[0]} {op[1]}" if len(op) > 1 else str(op) for op in matches])
-        
-        return file_ops
-    
-    def _extract_comments(self, content: str) -> List[str]:
-        """Extract comments that might contain business requirements"""
-        comments = []
-        
-        # COBOL comments start with * in column 7 or are between *> markers
-        lines = content.split('\n')
-        for line in lines:
-            if len(line) > 6 and line[6] == '*':
-                comment = line[7:].strip()
-                if len(comment) > 10:  # Only meaningful comments
-                    comments.append(comment)
-            elif '*>' in line:
-                comment = line.split('*>')[1].strip()
-                if len(comment) > 10:
-                    comments.append(comment)
-        
-        return comments
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0)
+        )
+        try:
+            yield self
+        finally:
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                optimizers_config=models.OptimizersConfigDiff(indexing_threshold=self.INDEXING_THRESHOLD)
+            )
     
     def extract_requirements_from_program(self, file_path: str) -> Dict:
         """
@@ -170,37 +70,103 @@ class COBOLRequirementsExtractor:
         GitHub Copilot can help enhance this with more sophisticated analysis.
         """
         program_info = self.parse_cobol_file(file_path)
-        
-        # Create requirement text for embedding
-        requirement_text = self._create_requirement_text(program_info)
-        
-        # Generate embedding
-        embedding = self.model.encode(requirement_text).tolist()
+        return self._store_programs([program_info])[0]
+    
+    def extract_requirements_from_string(self, code: str, file_name: str) -> Dict:
+        """
+        Extract requirements from COBOL source held in memory; `file_name` is recorded as its path.
+        """
+        program_info = self._parse_content(code.encode('utf-8'), file_name)
+        return self._store_programs([program_info])[0]
+    
+    def extract_requirements_from_programs(self, file_paths: List[str], max_workers: Optional[int] = None) -> List[Dict]:
+        """
+        Extract requirements from many COBOL programs with one batched encode and one upsert.
+        Batches of PARALLEL_PARSE_MIN_FILES or more are parsed in worker processes (max_workers=1 parses in-process).
+        Files that fail to parse are reported in place as {'file_path': ..., 'error': ...}.
+        """
+        if max_workers == 1 or len(file_paths) < self.PARALLEL_PARSE_MIN_FILES:
+            parsed = [_parse_file_safe(file_path) for file_path in file_paths]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+                parsed = list(executor.map(_parse_file_safe, file_paths, chunksize=8))
+        
+        program_infos = [program_info for program_info, error in parsed if error is None]
+        stored = iter(self._store_programs(program_infos))
+        return [
+            {'file_path': file_path, 'error': error} if error is not None else next(stored)
+            for file_path, (program_info, error) in zip(file_paths, parsed)
+        ]
+    
+    def _store_programs(self, program_infos: List[Dict]) -> List[Dict]:
+        """Embed parsed programs in a single batch and store them in the vector database"""
+        if not program_infos:
+            return []
+        
+        # Create requirement texts and embed them together
+        requirement_texts = [self._create_requirement_text(info) for info in program_infos]
+        embeddings = encode_smart(requirement_texts)
+        
+        ids = []
+        payloads = []
+        results = []
+        for program_info, requirement_text in zip(program_infos, requirement_texts):
+            point_id = str(uuid.uuid4())
+            ids.append(point_id)
+            
+            payloads.append({
+                'program_id': program_info['program_id'],
+                'file_path': program_info['file_path'],
+                'file_name': program_info['file_name'],
+                'requirement_text': requirement_text,
+                'extracted_data': program_info,
+                'extraction_timestamp': str(datetime.datetime.now())
+            })
+            
+            results.append({
+                'id': point_id,
+                'program_id': program_info['program_id'],
+                'requirements_extracted': len(program_info['business_logic']),
+                'data_items_found': len(program_info['data_items']),
+                'procedures_found': len(program_info['procedures'])
+            })
         
         # Store in vector database
-        point_id = str(uuid.uuid4())
-        
-        payload = {
-            'program_id': program_info['program_id'],
-            'file_path': file_path,
-            'file_name': program_info['file_name'],
-            'requirement_text': requirement_text,
-            'extracted_data': program_info,
-            'extraction_timestamp': str(datetime.datetime.now())
-        }
+        self.flush(ids, embeddings, payloads)
         
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=[models.PointStruct(id=point_id, vector=embedding, payload=payload)]
-        )
+        return results
+    
+    def flush(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict], wait: bool = True) -> None:
+        """
+        Write points to the collection in chunks of UPSERT_BATCH_SIZE, as column-oriented batches.
+        Only the final chunk waits; Qdrant applies updates in order, so that covers the earlier ones.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(ids) > self.UPLOAD_COLLECTION_THRESHOLD:
+            # upload_collection takes the 2-D array as is
+            self.client.upload_collection(
+                collection_name=self.collection_name,
+                vectors=vectors,
+                payload=payloads,
+                ids=ids,
+                batch_size=self.UPSERT_BATCH_SIZE,
+                parallel=4,
+                wait=wait
+            )
+            return
         
-        return {
-            'id': point_id,
-            'program_id': program_info['program_id'],
-            'requirements_extracted': len(program_info['business_logic']),
-            'data_items_found': len(program_info['data_items']),
-            'procedures_found': len(program_info['procedures'])
-        }
+        for start in range(0, len(ids), self.UPSERT_BATCH_SIZE):
+            end = start + self.UPSERT_BATCH_SIZE
+            self.client.upsert(
+                collection_name=self.collection_name,
+                # One tolist() per chunk instead of one list per point
+                points=models.Batch(
+                    ids=ids[start:end],
+                    vectors=vectors[start:end].tolist(),
+                    payloads=payloads[start:end]
+                ),
+                wait=wait and end >= len(ids)
+            )
     
     def _create_requirement_text(self, program_info: Dict) -> str:
         """
@@ -239,7 +205,7 @@ class COBOLRequirementsExtractor:
         Search for similar requirements or programs.
         GitHub Copilot can help improve the query processing.
         """
-        query_embedding = self.model.encode(query).tolist()
+        query_embedding = encode_smart([query])[0].tolist()
         
         results = self.client.search(
             collection_name=self.collection_name,
@@ -247,41 +213,84 @@ class COBOLRequirementsExtractor:
             limit=limit
         )
         
-        return [
-            {
-                'program_id': result.payload.get('program_id') if result.payload else 'Unknown',
-                'file_name': result.payload.get('file_name') if result.payload else 'Unknown',
-                'similarity_score': result.score,
-                'requirement_text': result.payload.get('requirement_text') if result.payload else ''
-            }
-            for result in results
+        return [self._format_search_result(result) for result in results]
+    
+    def search_many(self, queries: List[str], limit: int = 5) -> List[List[Dict]]:
+        """
+        Run several similarity searches in one Qdrant request.
+        Returns one result list per query, in the same order as `queries`.
+        """
+        if not queries:
+            return []
+        
+        query_embeddings = encode_smart(queries)
+        requests = [
+            models.SearchRequest(vector=embedding.tolist(), limit=limit, with_payload=True)
+            for embedding in query_embeddings
         ]
+        batch_results = self.client.search_batch(collection_name=self.collection_name, requests=requests)
+        
+        return [[self._format_search_result(result) for result in results] for results in batch_results]
+    
+    @staticmethod
+    def _format_search_result(result) -> Dict:
+        return {
+            'program_id': result.payload.get('program_id') if result.payload else 'Unknown',
+            'file_name': result.payload.get('file_name') if result.payload else 'Unknown',
+            'similarity_score': result.score,
+            'requirement_text': result.payload.get('requirement_text') if result.payload else ''
+        }
+    
+    def iter_requirements(self, with_payload=True, page_size: int = 256) -> Iterator[Dict]:
+        """
+        Yield stored payloads page by page, following scroll offsets until the collection is exhausted.
+        `with_payload` may be a list of payload keys to fetch only those fields.
+        """
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=page_size,
+                offset=offset,
+                with_payload=with_payload,
+                with_vectors=False
+            )
+            for point in points:
+                if point.payload is not None:
+                    yield point.payload
+            if offset is None:
+                break
     
     def get_all_requirements(self) -> List[Dict]:
         """Get all stored requirements"""
-        points, _ = self.client.scroll(collection_name=self.collection_name, limit=1000)
-        return [point.payload for point in points if point.payload is not None]
+        return list(self.iter_requirements())
 
 
 # Example usage for GitHub Copilot integration
-def process_cobol_directory(directory_path: str, extractor: COBOLRequirementsExtractor):
+def process_cobol_directory(directory_path: str, extractor: COBOLRequirementsExtractor, max_workers: Optional[int] = None):
     """
-    Process all COBOL files in a directory.
+    Process all COBOL files in a directory, parsing them across `max_workers` processes.
     GitHub Copilot can suggest improvements and additional file patterns.
     """
     cobol_extensions = ['.cbl', '.cob', '.cobol', '.CBL', '.COB']
-    results = []
+    file_paths = []
     
     for root, dirs, files in os.walk(directory_path):
         for file in files:
             if any(file.endswith(ext) for ext in cobol_extensions):
-                file_path = os.path.join(root, file)
-                try:
-                    result = extractor.extract_requirements_from_program(file_path)
-                    results.append(result)
-                    print(f"Processed: {file} - {result['requirements_extracted']} requirements extracted")
-                except Exception as e:
-                    print(f"Error processing {file}: {e}")
+                file_paths.append(os.path.join(root, file))
+    
+    with extractor.bulk_mode():
+        extracted = extractor.extract_requirements_from_programs(file_paths, max_workers=max_workers)
+    
+    results = []
+    for file_path, result in zip(file_paths, extracted):
+        file = os.path.basename(file_path)
+        if 'error' in result:
+            print(f"Error processing {file}: {result['error']}")
+        else:
+            results.append(result)
+            print(f"Processed: {file} - {result['requirements_extracted']} requirements extracted")
     
     return results
 
@@ -0,0 +1,127 @@
+"""
+Embeddings: process-wide SentenceTransformer model and Qdrant clients shared by the extractors.
+"""
+import functools
+import hashlib
+import os
+from typing import List, Optional, Union
+import numpy as np
+import torch
+from qdrant_client import QdrantClient
+from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+# "torch" (SentenceTransformer) or "onnx" (ONNX Runtime, int8 quantized)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(".cache", "onnx", MODEL_NAME))
+# Talk to Qdrant over gRPC (port 6334) instead of REST; vectors travel as packed floats
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "0") == "1"
+
+# Intra-op threads; PyTorch already defaults to the physical core count, so only override it when asked
+# (e.g. one thread per uvicorn worker). os.cpu_count() would count hyperthreads and CPUs outside a container's quota.
+if os.getenv("TORCH_NUM_THREADS"):
+    torch.set_num_threads(int(os.environ["TORCH_NUM_THREADS"]))
+
+
+class OnnxMiniLM:
+    """
+    all-MiniLM-L6-v2 exported to ONNX and dynamically quantized to int8 for CPU inference.
+    Implements the subset of SentenceTransformer.encode used in this project.
+    """
+    hf_model_id = f"sentence-transformers/{MODEL_NAME}"
+    quantized_file = "model_quantized.onnx"
+    max_seq_length = 256
+
+    def __init__(self, cache_dir: str = ONNX_CACHE_DIR):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        # Export and quantize once; later processes load the cached graph
+        if not os.path.exists(os.path.join(cache_dir, self.quantized_file)):
+            exported = ORTModelForFeatureExtraction.from_pretrained(self.hf_model_id, export=True)
+            exported.save_pretrained(cache_dir)
+            AutoTokenizer.from_pretrained(self.hf_model_id).save_pretrained(cache_dir)
+            ORTQuantizer.from_pretrained(exported).quantize(
+                save_dir=cache_dir,
+                quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            )
+
+        self.tokenizer = AutoTokenizer.from_pretrained(cache_dir)
+        self.ort_model = ORTModelForFeatureExtraction.from_pretrained(cache_dir, file_name=self.quantized_file)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        """Mean-pooled, L2-normalized embeddings, matching the sentence-transformers pipeline"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            inputs = self.tokenizer(
+                sentences[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            hidden = self.ort_model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+
+        embeddings = np.concatenate(batches) if batches else np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        # The model's last module is Normalize, so embeddings are always unit length
+        embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+@functools.lru_cache(maxsize=1)
+def get_model() -> Union[SentenceTransformer, OnnxMiniLM]:
+    """
+    Load the embedding model once per process and reuse it on every call.
+    Set EMBEDDING_BACKEND=onnx to use the quantized ONNX Runtime model instead of PyTorch.
+    """
+    if EMBEDDING_BACKEND == "onnx":
+        return OnnxMiniLM()
+    model = SentenceTransformer(MODEL_NAME)
+    model.eval()
+    return model
+
+
+@functools.lru_cache(maxsize=None)
+def get_qdrant_client(url: str, api_key: Optional[str] = None) -> QdrantClient:
+    """
+    Return a Qdrant client for the given URL, constructed once per (url, api_key).
+    Set QDRANT_PREFER_GRPC=1 to use the gRPC interface.
+    """
+    return QdrantClient(url=url, api_key=api_key, prefer_grpc=QDRANT_PREFER_GRPC)
+
+
+def encode_smart(texts: List[str], batch_size: int = 64) -> np.ndarray:
+    """
+    Encode texts in length-sorted batches so each batch pads to a similar length.
+    Identical texts are encoded once. Embeddings are returned in the original order of `texts`.
+    """
+    if not texts:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    # Boilerplate programs often yield the same requirement text; run the model once per distinct text
+    unique = {}
+    index = []
+    for text in texts:
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        index.append(unique.setdefault(key, len(unique)))
+    distinct = [None] * len(unique)
+    for text, slot in zip(texts, index):
+        distinct[slot] = text
+    order = np.argsort([len(t) for t in distinct], kind="stable")
+    with torch.inference_mode():
+        embeddings = get_model().encode(
+            [distinct[i] for i in order],
+            batch_size=batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+    return embeddings[np.argsort(order)][index]
@@ -0,0 +1,75 @@
+"""
+LLM Cache: content-addressed SQLite cache for LLMFallbackClient responses, so re-submitting the same code skips the paid LLM call.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from typing import Optional
+
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(".cache", "llm"))
+CACHE_FILE = "cache.sqlite3"
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def cache_key(provider: str, model: str, prompt: str, language: str, code: str) -> str:
+    """
+    sha256 over the length-prefixed fields, so no two different inputs can produce the same byte stream.
+    """
+    digest = hashlib.sha256()
+    for field in (provider, model, prompt, language, code):
+        data = field.encode("utf-8")
+        digest.update(struct.pack(">Q", len(data)))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _connection() -> sqlite3.Connection:
+    """
+    One connection per thread. WAL mode lets readers in other processes proceed while one writes.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(CACHE_DIR, CACHE_FILE), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, provider TEXT, result TEXT, ts REAL)")
+        _local.conn = conn
+    return conn
+
+
+def load(key: str) -> Optional[dict]:
+    """Return the cached response for `key`, or None on a miss or when the cache cannot be read."""
+    try:
+        row = _connection().execute("SELECT provider, result FROM cache WHERE key = ?", (key,)).fetchone()
+    except (OSError, sqlite3.Error) as e:
+        logger.debug("LLM cache read failed: %s", e)
+        return None
+    if row is None:
+        return None
+    return {"success": True, "provider": "cache", "cached_provider": row[0], "result": row[1]}
+
+
+def save(key: str, response: dict) -> None:
+    """
+    Store a successful response; an existing entry for the same key is replaced.
+    A response without text is not stored, so a cache hit never answers with an empty or "None" result.
+    Best-effort: a cache that cannot be written is logged and skipped, never failing the request.
+    """
+    result = response.get("result")
+    if not isinstance(result, str) or not result:
+        return
+    try:
+        with _connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, provider, result, ts) VALUES (?, ?, ?, ?)",
+                (key, response.get("provider"), result, time.time())
+            )
+    except (OSError, sqlite3.Error) as e:
+        logger.debug("LLM cache write failed: %s", e)
@@ -1,20 +1,152 @@
 
+import asyncio
+import functools
 import json
+import logging
 import os
-import re
-from typing import Optional
-from openai import OpenAI as OpenAIClient
-import google.generativeai as genai
+import queue
+import random
+import sys
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+import llm_cache
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # optional: fall back to the stdlib parser
+    _json_loads = json.loads
+
+# Failure kinds that count towards opening a provider's circuit breaker
+BREAKER_KINDS = frozenset({"rate_limit", "auth"})
+# Transient failure kinds retried against the same provider before it counts as failed
+RETRY_KINDS = frozenset({"rate_limit", "server"})
+# Backoff schedule between retries, in seconds
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+logger = logging.getLogger(__name__)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _provider_loop() -> asyncio.AbstractEventLoop:
+    """
+    Event loop on a daemon thread that runs every provider call, so ask() works from any thread
+    (including one with its own running loop) and async SDK clients always stay on one loop.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-provider-loop", daemon=True).start()
+    return _loop
+
+
+class ProviderUnavailable(RuntimeError):
+    """A provider cannot be called at all: its package or API key is missing."""
+
+
+def _lazy_openai():
+    """Import the openai SDK on first use, so processes that only call Gemini never load it."""
+    import openai
+    return openai
+
+
+def _lazy_genai():
+    """Import google.generativeai on first use, so processes that only call OpenAI never load it."""
+    import google.generativeai as genai
+    return genai
+
+
+def _error_kind(exc: BaseException) -> str:
+    """Classify a provider exception as rate_limit, timeout, server, auth or other."""
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(exc, ProviderUnavailable):
+        return "auth"
+    # An SDK exception can only exist once its package has been imported
+    openai = sys.modules.get("openai")
+    if openai is not None:
+        if isinstance(exc, openai.RateLimitError):
+            return "rate_limit"
+        if isinstance(exc, openai.APITimeoutError):
+            return "timeout"
+        if isinstance(exc, (openai.AuthenticationError, openai.PermissionDeniedError)):
+            return "auth"
+        if isinstance(exc, openai.APIStatusError):
+            if exc.status_code == 429:
+                return "rate_limit"
+            return "server" if exc.status_code >= 500 else "other"
+        if isinstance(exc, openai.APIConnectionError):
+            return "server"
+    google_exceptions = sys.modules.get("google.api_core.exceptions")
+    if google_exceptions is not None:
+        if isinstance(exc, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+            return "rate_limit"
+        if isinstance(exc, google_exceptions.DeadlineExceeded):
+            return "timeout"
+        if isinstance(exc, (google_exceptions.Unauthenticated, google_exceptions.PermissionDenied)):
+            return "auth"
+        if isinstance(exc, google_exceptions.ServerError):
+            return "server"
+    return "other"
+
+
+def _retryable(exc: BaseException, kind: str) -> bool:
+    """Whether a failure may clear on retry; an exhausted OpenAI quota is also a 429 but only clears with billing."""
+    return kind in RETRY_KINDS and getattr(exc, "code", None) != "insufficient_quota"
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with +/-50% jitter, so clients that failed together do not retry together."""
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _compose_prompt(user_prompt: str, code: str, program: str) -> str:
+    """
+    Prompt for business rule extraction, sent to every provider. A single join sizes the result
+    once instead of copying the code through each step of a format chain.
+    """
+    return "".join((user_prompt, "\n\nProgram Language: ", program, "\n\nCode:\n", code, "\n"))
+
+
+@functools.lru_cache(maxsize=4)
+def _load_api_keys(config_path: str) -> Tuple[Tuple[str, str], ...]:
+    """
+    Parse the API key file once; returned as a tuple so callers cannot mutate the cached value.
+    """
+    if not os.path.exists(config_path):
+        logger.debug("No llm_config.json found at %s", config_path)
+        return ()
+    try:
+        # Bytes go straight to the parser; both orjson and json decode UTF-8 themselves
+        with open(config_path, "rb") as fh:
+            txt = fh.read().strip()
+            if not txt:
+                logger.debug("File %s is empty.", config_path)
+                return ()
+            try:
+                keys = _json_loads(txt)
+                logger.debug("Loaded keys from JSON in %s: %s", config_path, list(keys.keys()))
+                return tuple(keys.items())
+            except Exception as e:
+                logger.debug("Error parsing JSON in %s: %s", config_path, e)
+                return ()
+    except Exception as e:
+        logger.debug("Error reading %s: %s", config_path, e)
+        return ()
+
 
 class LLMFallbackClient:
     def extract_text(self, llm_result: dict) -> str:
         """
         Extract plain string from LLM result dict for embedding/model.encode.
         """
-        text = llm_result.get("result", "")
-        if not isinstance(text, str):
-            text = str(text)
-        return text
+        # Provider calls and the cache always return the result as a non-empty str
+        return llm_result.get("result") or ""
     """
     A multi-provider merge agent. Tries OpenAI, then Gemini, then a deterministic fallback.
 
@@ -23,129 +155,378 @@ class LLMFallbackClient:
 
     def ask(self, user_prompt: str, code: str, program: str = "COBOL") -> dict:
         """
-        Try OpenAI first, fall back to Gemini if OpenAI fails or quota exceeded. Returns extracted business rules/requirements.
+        Try OpenAI, then Gemini if OpenAI fails, and return the first successful result. Returns extracted business
+        rules/requirements. With `hedge_delay` set, Gemini is also started once OpenAI has run that many seconds without
+        answering, and the faster of the two wins. Identical requests are answered from the LLM cache.
+        Blocks the calling thread; use aask() from async code.
+        """
+        return asyncio.run_coroutine_threadsafe(self._ask(user_prompt, code, program), _provider_loop()).result()
+
+    async def aask(self, user_prompt: str, code: str, program: str = "COBOL") -> dict:
+        """
+        Async version of ask(): same cache and fallback without blocking the event loop.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._ask(user_prompt, code, program), _provider_loop())
+        return await asyncio.wrap_future(future)
+
+    def ask_stream(self, user_prompt: str, code: str, program: str = "COBOL") -> Iterator[str]:
+        """
+        Yield the response text as the provider generates it, for callers that show partial output.
+        Providers are tried in priority order without hedging; a cached response is yielded in one piece.
+        Raises RuntimeError if every provider fails before producing text.
         """
+        chunks = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._stream(user_prompt, code, program, chunks.put), _provider_loop())
         try:
-            result = self._try_openai(user_prompt, code, program)
-            # Check for OpenAI quota error
-            error_msg = str(result.get("error", ""))
-            if result.get("success"):
-                return result
-            elif "429" in error_msg or "insufficient_quota" in error_msg:
-                print(f"[LLMFallbackClient] OpenAI quota exceeded, trying Gemini...")
+            while (chunk := chunks.get()) is not None:
+                yield chunk
+            future.result()
+        finally:
+            # The consumer may stop early; don't leave the provider stream running
+            future.cancel()
+
+    async def _ask(self, user_prompt: str, code: str, program: str) -> dict:
+        """
+        Run on the provider loop: identical concurrent requests share one call instead of each paying for it.
+        """
+        key = (user_prompt, code, program)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._ask_once(user_prompt, code, program))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller giving up does not cancel the call for the others; each gets its own copy
+        return dict(await asyncio.shield(task))
+
+    async def _ask_once(self, user_prompt: str, code: str, program: str) -> dict:
+        """
+        Answer from the LLM cache, or race the providers and cache a success.
+        """
+        if not self.use_cache:
+            return await self._race(user_prompt, code, program)
+        loop = asyncio.get_running_loop()
+        key = self._cache_key(user_prompt, code, program)
+        # SQLite may wait on another process's lock; keep that off the provider loop
+        cached = await loop.run_in_executor(None, llm_cache.load, key)
+        if cached is not None:
+            return cached
+        result = await self._race(user_prompt, code, program)
+        if result.get("success"):
+            await loop.run_in_executor(None, llm_cache.save, key, result)
+        return result
+
+    async def _race(self, user_prompt: str, code: str, program: str) -> dict:
+        """
+        Run on the provider loop: first successful provider wins, the other calls are cancelled.
+        Providers are started in priority order, skipping those whose circuit breaker is open; the next one starts
+        when the last fails or, if hedging, after `hedge_delay` seconds.
+        """
+        calls = {"openai": self._try_openai, "gemini": self._try_gemini}
+        # Built once and shared, so every provider receives identical bytes
+        prompt = _compose_prompt(user_prompt, code, program)
+        waiting = self._available_providers()
+
+        def start(provider: str) -> asyncio.Task:
+            return asyncio.create_task(self._call(provider, calls[provider](prompt)))
+
+        pending = {start(waiting.pop(0))}
+        errors = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    result = task.result()
+                    if result.get("success"):
+                        return result
+                    errors.append(result)
+                if waiting:
+                    # The last provider failed or is still running after its head start
+                    pending.add(start(waiting.pop(0)))
+        finally:
+            for task in pending:
+                task.cancel()
+        return self._combine_errors(errors)
+
+    async def _stream(self, user_prompt: str, code: str, program: str, emit: Callable[[Optional[str]], None]) -> None:
+        """
+        Run on the provider loop: pass response text to `emit` as it arrives, then None when done.
+        Providers are tried in turn until one starts streaming; after the first text there is no fallback.
+        Opening a stream is retried and bounded like a non-streaming call (see _open_stream).
+        """
+        try:
+            key = self._cache_key(user_prompt, code, program)
+            loop = asyncio.get_running_loop()
+            cached = await loop.run_in_executor(None, llm_cache.load, key) if self.use_cache else None
+            if cached is not None:
+                emit(cached["result"])
+                return
+            streams = {"openai": self._stream_openai, "gemini": self._stream_gemini}
+            prompt = _compose_prompt(user_prompt, code, program)
+            errors = []
+            for provider in self._available_providers():
                 try:
-                    result = self._try_gemini(user_prompt, code, program)
-                    return result
+                    # Failures while opening are already counted by _with_retries
+                    chunks = await streams[provider](prompt)
                 except Exception as e:
-                    print(f"[LLMFallbackClient] Gemini exception: {e}")
-                    return {"success": False, "error": f"Gemini failed after OpenAI quota error: {e}"}
-            else:
-                print(f"[LLMFallbackClient] OpenAI failed: {result.get('error')}")
-        except Exception as e:
-            print(f"[LLMFallbackClient] OpenAI exception: {e}")
-        # Fallback to Gemini for any other error
+                    errors.append(self._failure(provider, e))
+                    continue
+                parts = []
+                try:
+                    async for text in chunks:
+                        parts.append(text)
+                        emit(text)
+                    if not parts:
+                        raise RuntimeError("stream ended without text")
+                except Exception as e:
+                    failure = self._failure(provider, e)
+                    self._record(provider, failure["error_kind"])
+                    if parts:
+                        raise
+                    errors.append(failure)
+                    continue
+                result = {"success": True, "provider": provider, "result": "".join(parts)}
+                self._record(provider)
+                if self.use_cache:
+                    await loop.run_in_executor(None, llm_cache.save, key, result)
+                return
+            raise RuntimeError(self._combine_errors(errors)["error"])
+        finally:
+            emit(None)
+
+    def _available_providers(self) -> List[str]:
+        """Providers in priority order, without those whose circuit breaker is open."""
+        now = time.monotonic()
+        providers = [p for p in self.provider_priority if self._breaker[p]["open_until"] <= now]
+        # Every breaker is open; trying them all beats failing without a call
+        return providers or list(self.provider_priority)
+
+    def _cache_key(self, user_prompt: str, code: str, program: str) -> str:
+        return llm_cache.cache_key(",".join(self.provider_priority), self.model_name, user_prompt, program, code)
+
+    @staticmethod
+    def _combine_errors(errors: List[dict]) -> dict:
+        if len(errors) == 1:
+            return errors[0]
+        return {
+            "success": False,
+            "error": f"All providers failed: {'; '.join(e['error'] for e in errors)}",
+            "error_kind": errors[-1]["error_kind"]
+        }
+
+    def _record(self, provider: str, error_kind: Optional[str] = None) -> None:
+        """
+        Update the provider's circuit breaker with a success (no `error_kind`) or a failure: `breaker_threshold`
+        consecutive rate-limit or auth failures skip the provider for `breaker_cooldown` seconds.
+        Only called on the provider loop.
+        """
+        state = self._breaker[provider]
+        if error_kind is None:
+            state["fails"] = 0
+        elif error_kind in BREAKER_KINDS:
+            state["fails"] += 1
+            if state["fails"] >= self.breaker_threshold:
+                state["open_until"] = time.monotonic() + self.breaker_cooldown
+                logger.warning("%s skipped for %ss after %d failures", provider, self.breaker_cooldown, state["fails"])
+
+    @staticmethod
+    async def _call(provider: str, call) -> dict:
+        """Await one provider call, turning exceptions into a failed result with an `error_kind`."""
         try:
-            result = self._try_gemini(user_prompt, code, program)
-            return result
+            return await call
         except Exception as e:
-            print(f"[LLMFallbackClient] Gemini exception: {e}")
-            return {"success": False, "error": f"Both providers failed: {e}"}
+            return LLMFallbackClient._failure(provider, e)
+
+    @staticmethod
+    def _failure(provider: str, exc: Exception) -> dict:
+        """Failed result for a provider exception, classified by _error_kind()."""
+        kind = _error_kind(exc)
+        logger.warning("%s failed (%s): %s", provider, kind, exc)
+        return {"success": False, "provider": provider, "error": f"{provider}: {exc}", "error_kind": kind}
 
     @staticmethod
     def load_api_keys(path: str = "llm_config.json") -> dict:
         """Load API keys from a small config file (JSON or key=value lines).
-        Handles both absolute and relative paths. Adds debug prints for diagnostics.
+        Handles both absolute and relative paths. The file is read once per process.
         """
-        config_path = "llm_config.json"
-        if not os.path.exists(config_path):
-            print(f"[load_api_keys] No llm_config.json found at {config_path}")
-            return {}
-        try:
-            with open(config_path, "r", encoding="utf-8") as fh:
-                txt = fh.read().strip()
-                if not txt:
-                    print(f"[load_api_keys] File {config_path} is empty.")
-                    return {}
-                try:
-                    keys = json.loads(txt)
-                    print(f"[load_api_keys] Loaded keys from JSON in {config_path}: {list(keys.keys())}")
-                    return keys
-                except Exception as e:
-                    print(f"[load_api_keys] Error parsing JSON in {config_path}: {e}")
-                    return {}
-        except Exception as e:
-            print(f"[load_api_keys] Error reading {config_path}: {e}")
-            return {}
+        return dict(_load_api_keys("llm_config.json"))
 
-    def __init__(self, model_name: str = "gpt-3.5-turbo", api_keys_path: str = "api_keys.txt", provider_priority=None):
+    def __init__(self, model_name: str = "gpt-3.5-turbo", api_keys_path: str = "api_keys.txt", provider_priority=None,
+                 hedge_delay: Optional[float] = None, openai_timeout: float = 15.0, gemini_timeout: float = 60.0,
+                 breaker_threshold: int = 3, breaker_cooldown: float = 60.0, use_cache: bool = True,
+                 max_retries: int = 2):
         self.model_name = model_name
         self.api_keys = self.load_api_keys(api_keys_path)
         # Always try OpenAI first, then Gemini
         self.provider_priority = ["openai", "gemini"]
+        # Answer repeated (prompt, code, program) requests from the SQLite cache in llm_cache
+        self.use_cache = use_cache
+        # Seconds OpenAI may run alone before Gemini is started as a hedge; None (default) starts Gemini only
+        # after OpenAI fails, since hedging bills both providers whenever OpenAI is slower than the delay.
+        # Set it near OpenAI's p95 latency to trade that spend for tail latency.
+        self.hedge_delay = hedge_delay
+        # Upper bound in seconds on a single provider request; a timeout counts as a failure and triggers fallback
+        self.openai_timeout = openai_timeout
+        self.gemini_timeout = gemini_timeout
+        # Retries of a transient failure (RETRY_KINDS) per provider call, done by _with_retries for every
+        # provider; the openai client's own retries are disabled so each attempt stays within openai_timeout
+        self.max_retries = max_retries
+        # Circuit breaker per provider: consecutive failures and the monotonic time it may be tried again
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._breaker = {provider: {"fails": 0, "open_until": 0.0} for provider in self.provider_priority}
+        # Requests currently being answered, keyed by (user_prompt, code, program); only used on the provider loop
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        # Build provider clients once so every call reuses the same connection pool. Only providers
+        # with a key are imported; the reason a provider cannot be used is kept for its calls to report.
+        self._unavailable = {}
+        self._openai = None
+        if not self.api_keys.get("OPENAI_API_KEY"):
+            self._unavailable["openai"] = "OpenAI API key not found in llm_config.json (use key 'OPENAI_API_KEY')"
+        else:
+            try:
+                self._openai = _lazy_openai().AsyncOpenAI(
+                    api_key=self.api_keys["OPENAI_API_KEY"], timeout=self.openai_timeout, max_retries=0
+                )
+            except ImportError:
+                self._unavailable["openai"] = "openai python package not available"
+        self._gemini_model = None
+        if not self.api_keys.get("GEMINI_API_KEY"):
+            self._unavailable["gemini"] = "Gemini API key not found in llm_config.json (use key 'GEMINI_API_KEY')"
+        else:
+            try:
+                genai = _lazy_genai()
+            except ImportError:
+                genai = None
+            if genai is None or not hasattr(genai, "GenerativeModel"):
+                self._unavailable["gemini"] = "google.generativeai package not available"
+            else:
+                genai.configure(api_key=self.api_keys["GEMINI_API_KEY"])
+                self._gemini_model = genai.GenerativeModel(model_name="gemini-2.0-flash")
 
-    def _try_openai(self, user_prompt: str, code: str, program: str = "COBOL") -> dict:
+    async def _try_openai(self, prompt: str) -> dict:
         """
-        Call OpenAI LLM with a user prompt, code, and program name. Returns extracted business rules/requirements.
+        Call OpenAI LLM with a prompt built by _compose_prompt(). Returns extracted business rules/requirements.
         """
-        if OpenAIClient is None:
-            raise RuntimeError("openai python package not available")
-        api_key = self.api_keys.get("OPENAI_API_KEY")
-        if not api_key:
-            raise RuntimeError("OpenAI API key not found in llm_config.json (use key 'OPENAI_API_KEY')")
-        client = OpenAIClient(api_key=api_key)
-        # Compose prompt for business rule extraction
-        prompt = (
-            f"{user_prompt}\n\nProgram Language: {program}\n\nCode:\n{code}\n"
-        )
-        try:
-            resp = client.chat.completions.create(
+        resp = await self._with_retries(
+            "openai",
+            lambda: self._openai.chat.completions.create(
                 model=self.model_name,
                 messages=[
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.2,
-            )
-            content = resp.choices[0].message.content
-            return {"success": True, "provider": "openai", "result": content}
-        except Exception as e:
-            return {"success": False, "error": str(e)}
-
-    def _try_gemini(self, user_prompt: str, code: str, program: str = "COBOL") -> dict:
-        """
-        Call Gemini LLM with a user prompt, code, and program name. Returns extracted business rules/requirements.
-        """
-        if genai is None:
-            raise RuntimeError("google.generativeai package not available")
-        api_key = self.api_keys.get("GEMINI_API_KEY")
-        if not api_key:
-            raise RuntimeError("Gemini API key not found in llm_config.json (use key 'GEMINI_API_KEY')")
-        os.environ["GOOGLE_API_KEY"] = api_key
-        genai.configure(api_key=api_key)
-        # Compose prompt for business rule extraction
-        prompt = (
-            f"{user_prompt}\n\nProgram Language: {program}\n\nCode:\n{code}\n"
+            ),
+            self.openai_timeout
         )
-        try:
-            if hasattr(genai, "GenerativeModel"):
-                model = genai.GenerativeModel(model_name="gemini-2.0-flash")
-                resp = model.generate_content(prompt)
+        return {"success": True, "provider": "openai", "result": self._openai_content(resp)}
+
+    async def _try_gemini(self, prompt: str) -> dict:
+        """
+        Call Gemini LLM with a prompt built by _compose_prompt(). Returns extracted business rules/requirements.
+        """
+        resp = await self._with_retries(
+            "gemini",
+            lambda: self._gemini_model.generate_content_async(prompt, request_options={"timeout": self.gemini_timeout}),
+            self.gemini_timeout
+        )
+        return {"success": True, "provider": "gemini", "result": self._gemini_content(resp)}
+
+    async def _with_retries(self, provider: str, request: Callable, timeout: float):
+        """
+        Await `request()` with each attempt bounded by `timeout` seconds. Failures in RETRY_KINDS are retried
+        up to `max_retries` times with jittered backoff; anything else, including a timeout, is raised at once.
+        Raises ProviderUnavailable without a request if the provider has no client. The outcome goes to the
+        circuit breaker, a failure as soon as the first attempt fails.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                if provider in self._unavailable:
+                    raise ProviderUnavailable(self._unavailable[provider])
+                response = await asyncio.wait_for(request(), timeout=timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"request timed out after {timeout}s")
+            except Exception as e:
+                kind = _error_kind(e)
+                if attempt == 0:
+                    # Counted now: a hedged provider may win and cancel this call while it backs off
+                    self._record(provider, kind)
+                if attempt == self.max_retries or not _retryable(e, kind):
+                    raise
+                logger.debug("%s attempt %d failed, retrying: %s", provider, attempt + 1, e)
+                await asyncio.sleep(_backoff(attempt))
             else:
-                print("[Gemini Diagnostic] google.generativeai attributes:", dir(genai))
-                raise RuntimeError(
-                    "Gemini provider usage error: The expected GenerativeModel API is not available in your installed google-generativeai package. "
-                    "Please check the printed attributes above and consult https://github.com/google/generative-ai-python for correct usage. "
-                    "You may need to update the package or adjust the provider code to match your installed version."
-                )
-        except Exception as e:
-            raise RuntimeError(f"Gemini request failed: {e}")
+                self._record(provider)
+                return response
 
-        content = None
-        try:
-            content = resp.candidates[0].content
-        except Exception:
+    async def _open_stream(self, provider: str, request: Callable, timeout: float) -> AsyncIterator:
+        """
+        Start a streaming request and return its chunks. Opening it and receiving the first chunk go through
+        _with_retries, so they are retried and bounded by `timeout`; later chunks are not, as a long response
+        may stream for longer than that.
+        """
+        async def first_chunk():
+            chunks = (await request()).__aiter__()
             try:
-                content = resp.text
-            except Exception:
-                content = str(resp)
-        return {"success": True, "provider": "gemini", "result": content}
-        
+                return (await chunks.__anext__(),), chunks
+            except StopAsyncIteration:
+                return (), chunks
+
+        head, rest = await self._with_retries(provider, first_chunk, timeout)
+
+        async def replay():
+            for chunk in head:
+                yield chunk
+            async for chunk in rest:
+                yield chunk
+
+        return replay()
+
+    async def _stream_openai(self, prompt: str) -> AsyncIterator[str]:
+        """Streaming variant of _try_openai; opens the stream and returns its content deltas."""
+        chunks = await self._open_stream(
+            "openai",
+            lambda: self._openai.chat.completions.create(
+                model=self.model_name,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+                stream=True,
+            ),
+            self.openai_timeout
+        )
+        return (chunk.choices[0].delta.content async for chunk in chunks if chunk.choices and chunk.choices[0].delta.content)
+
+    async def _stream_gemini(self, prompt: str) -> AsyncIterator[str]:
+        """Streaming variant of _try_gemini; opens the stream and returns the text of each chunk."""
+        chunks = await self._open_stream(
+            "gemini",
+            lambda: self._gemini_model.generate_content_async(
+                prompt, stream=True, request_options={"timeout": self.gemini_timeout}
+            ),
+            self.gemini_timeout
+        )
+        # _gemini_content raises on a chunk without text (e.g. a blocked final chunk) instead of a bare ValueError
+        return (text async for chunk in chunks if (text := self._gemini_content(chunk)))
+
+    @staticmethod
+    def _openai_content(resp) -> str:
+        """Message text of an OpenAI completion. Raises if there is none, so it is never cached or stored."""
+        choice = resp.choices[0]
+        if not choice.message.content:
+            # e.g. a refusal or the content filter
+            raise RuntimeError(f"OpenAI returned no text (finish_reason={choice.finish_reason})")
+        return choice.message.content
+
+    @staticmethod
+    def _gemini_content(resp) -> str:
+        """Generated text of a Gemini response. Raises if there is none, so it is never cached or stored."""
+        try:
+            return resp.text
+        except ValueError as e:
+            # No text part, e.g. the candidate was blocked
+            raise RuntimeError(f"Gemini returned no text: {e}") from e
\ No newline at end of file
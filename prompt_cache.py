@@ -0,0 +1,111 @@
+"""
+Prompt Cache: semantic cache that reuses an earlier LLM response when near-identical code
+is submitted again, using a dedicated Qdrant collection as the index.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import List, Optional
+from qdrant_client.http.models import Distance, FieldCondition, Filter, MatchValue, PointStruct, VectorParams
+from embeddings import EMBEDDING_DIM, encode_smart, get_qdrant_client
+
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+COLLECTION = "prompt_cache"
+# The encoder only sees the first 256 tokens of the code, so programs that share a long
+# header can look identical; the cache is therefore opt-in and the threshold strict.
+ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "0") == "1"
+SCORE_THRESHOLD = float(os.getenv("PROMPT_CACHE_THRESHOLD", "0.97"))
+
+qdrant = get_qdrant_client(QDRANT_URL)
+_collection_ready = False
+
+
+def ensure_collection_exists():
+    """
+    Ensure the prompt_cache collection exists in Qdrant. Checked once per process.
+    """
+    global _collection_ready
+    if _collection_ready:
+        return
+    collection_names = [c.name for c in qdrant.get_collections().collections]
+    if COLLECTION not in collection_names:
+        qdrant.create_collection(
+            collection_name=COLLECTION,
+            vectors_config=VectorParams(size=EMBEDDING_DIM, distance=Distance.COSINE)
+        )
+    _collection_ready = True
+
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _scope(prompt: str, language: str) -> Filter:
+    """Only responses produced for the same prompt and language may be reused."""
+    return Filter(must=[
+        FieldCondition(key="prompt_hash", match=MatchValue(value=_prompt_hash(prompt))),
+        FieldCondition(key="language", match=MatchValue(value=language)),
+    ])
+
+
+def lookup(vector: List[float], prompt: str, language: str) -> Optional[dict]:
+    """Return the stored response of the closest cached code above the threshold, if any."""
+    ensure_collection_exists()
+    hits = qdrant.search(
+        collection_name=COLLECTION,
+        query_vector=vector,
+        query_filter=_scope(prompt, language),
+        limit=1,
+        score_threshold=SCORE_THRESHOLD,
+        with_payload=True
+    )
+    return hits[0].payload["response"] if hits else None
+
+
+def store(vector: List[float], prompt: str, language: str, response: dict) -> None:
+    """Index a successful response under the code embedding."""
+    qdrant.upsert(
+        collection_name=COLLECTION,
+        points=[PointStruct(
+            id=str(uuid.uuid4()),
+            vector=vector,
+            payload={
+                "prompt_hash": _prompt_hash(prompt),
+                "language": language,
+                # Provider results may be SDK objects; payloads must be plain JSON
+                "response": {k: v if isinstance(v, (str, int, float, bool, type(None))) else str(v) for k, v in response.items()}
+            }
+        )]
+    )
+
+
+def semantic_ask(client, prompt: str, code: str, language: str) -> dict:
+    """
+    client.ask() behind the semantic cache; near-duplicate code returns the cached response.
+    """
+    if not ENABLED:
+        return client.ask(prompt, code, language)
+    vector = encode_smart([code])[0].tolist()
+    response = lookup(vector, prompt, language)
+    if response is None:
+        response = client.ask(prompt, code, language)
+        if response.get("success"):
+            store(vector, prompt, language, response)
+    return response
+
+
+async def semantic_aask(client, prompt: str, code: str, language: str) -> dict:
+    """
+    Async version of semantic_ask(); embedding and Qdrant calls run in the default executor.
+    """
+    if not ENABLED:
+        return await client.aask(prompt, code, language)
+    loop = asyncio.get_running_loop()
+    vector = (await loop.run_in_executor(None, encode_smart, [code]))[0].tolist()
+    response = await loop.run_in_executor(None, lookup, vector, prompt, language)
+    if response is None:
+        response = await client.aask(prompt, code, language)
+        if response.get("success"):
+            await loop.run_in_executor(None, store, vector, prompt, language, response)
+    return response